@@ -1,16 +1,59 @@
 import requests
-from bs4 import BeautifulSoup
+import requests_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from selectolax.lexbor import LexborHTMLParser
 import sys
 import argparse
+import functools
+import html
 import unicodedata
-import json
+import orjson
 import os
+import re
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from urllib.parse import urljoin
 
 # Default configuration values
 DEFAULT_CONFIG_FILE = "config.json"
 DEFAULT_SEEN_FILE = "seen_offers.json"
+DEFAULT_CACHE_FILE = "imoova_cache"
+
+@functools.lru_cache(maxsize=None)
+def get_session():
+    """Shared cached HTTP session, built on first use."""
+    session = requests_cache.CachedSession(
+        cache_name=DEFAULT_CACHE_FILE,
+        backend="sqlite",
+        expire_after=60,
+        stale_if_error=timedelta(minutes=10),
+    )
+    session.headers["User-Agent"] = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+    session.mount("https://", HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=10,
+        max_retries=Retry(
+            total=5,
+            backoff_factor=0.5,
+            status_forcelist=[429, 502, 503, 504],
+            allowed_methods=frozenset(["GET", "POST"]),
+            respect_retry_after_header=True,
+        ),
+    ))
+    return session
+
+# Column layout of the imoova relocations table
+COL_ID, COL_ORIGIN, COL_ARR, COL_START, COL_END, COL_MODEL, COL_DAYS = 0, 1, 2, 3, 4, 5, 7
+NUM_COLS = COL_DAYS + 1
+
+# Telegram caps messages at 4096 chars; keep some headroom
+MAX_MESSAGE_LEN = 4000
+MESSAGE_SEPARATOR = "\n\n"
+
+# Worker pool for sending Telegram messages to several chats concurrently
+_EXECUTOR = ThreadPoolExecutor(max_workers=8)
 
 def load_config():
     """Load configuration from config.json file or environment variables."""
@@ -24,72 +67,87 @@ def load_config():
     config_file = os.getenv("CONFIG_FILE", DEFAULT_CONFIG_FILE)
     if os.path.exists(config_file):
         try:
-            with open(config_file, 'r', encoding='utf-8') as f:
-                file_config = json.load(f)
+            with open(config_file, 'rb') as f:
+                file_config = orjson.loads(f.read())
                 config.update(file_config)
         except Exception as e:
             print(f"Warning: Could not load {config_file}: {e}")
     
     return config
 
-# Load configuration
-config = load_config()
+
+def _rows_from_lexbor(content: bytes):
+    """Yield (cell texts, first-cell href) per table row using a full HTML parse."""
+    table = LexborHTMLParser(content).css_first("table")
+    rows = table.css("tr") if table else []
+    for tr in rows:
+        cols = tr.css("td")
+        if not cols:
+            continue
+        link_elem = cols[COL_ID].css_first("a")
+        href = (link_elem.attributes.get("href") or "") if link_elem else ""
+        yield [col.text(strip=True) for col in cols[:NUM_COLS]], href
+
+
+def _campers_from_rows(rows):
+    campers = []
+    seen_ids = set()
+    for texts, href in rows:
+        if len(texts) <= COL_ARR:
+            continue
+        # Pad short rows so every column index is valid
+        texts = texts + [""] * (NUM_COLS - len(texts))
+        offer_id, origin, arrival = texts[COL_ID], texts[COL_ORIGIN], texts[COL_ARR]
+        if offer_id and origin and arrival and origin.lower() != "origin":
+            if offer_id not in seen_ids:
+                campers.append({
+                    "id": offer_id,
+                    # urljoin keeps absolute URLs and resolves relative and protocol-relative ones
+                    "url": urljoin("https://www.imoova.com", href) if href else "",
+                    "origin": origin,
+                    "arrival": arrival,
+                    "start": texts[COL_START],
+                    "end": texts[COL_END],
+                    "model": texts[COL_MODEL],
+                    "days": texts[COL_DAYS],
+                })
+                seen_ids.add(offer_id)
+    return campers
+
+
+def parse_campers(content: bytes):
+    """Extract campers from the raw relocations page."""
+    return _campers_from_rows(_rows_from_lexbor(content))
 
 
 def fetch_imoova_campers():
     url = "https://www.imoova.com/en/relocations/table?region=EU"
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-    }
+    # Accept-Encoding is left to requests, which already advertises every
+    # compression scheme it can decode (gzip/deflate, plus br when brotli is installed)
+    headers = {"Accept": "text/html"}
 
-    response = requests.get(url, headers=headers, timeout=15)
+    response = get_session().get(url, headers=headers, timeout=15)
     response.raise_for_status()
-    soup = BeautifulSoup(response.text, "html.parser")
+    return parse_campers(response.content)
 
-    campers = []
-    seen_ids = set()
 
-    # Strategy: look for table rows and use columns
-    for tr in soup.select("table tr"):
-        cols = tr.find_all("td")
-        # sample table: [id, origin, arrival, start, end, model, ...]
-        if len(cols) >= 3:
-            # Get both the ID and URL from first column
-            offer_id = cols[0].get_text(strip=True)
-            offer_url = ""
-            link_elem = cols[0].find("a")
-            if link_elem and link_elem.get("href"):
-                offer_url = "https://www.imoova.com" + link_elem["href"] if not link_elem["href"].startswith("http") else link_elem["href"]
-            
-            origin = cols[1].get_text(strip=True)
-            arrival = cols[2].get_text(strip=True)
-            start = cols[3].get_text(strip=True) if len(cols) > 3 else ""
-            end = cols[4].get_text(strip=True) if len(cols) > 4 else ""
-            model = cols[5].get_text(strip=True) if len(cols) > 5 else ""
-            days = cols[7].get_text(strip=True) if len(cols) > 7 else ""
-            if offer_id and origin and arrival and origin.lower() != "origin":
-                if offer_id not in seen_ids:
-                    campers.append({
-                        "id": offer_id,
-                        "url": offer_url,
-                        "origin": origin,
-                        "arrival": arrival,
-                        "start": start,
-                        "end": end,
-                        "model": model,
-                        "days": days,
-                    })
-                    seen_ids.add(offer_id)
-    return campers
 
+def _write_json_atomic(path: str, obj):
+    """Serialize `obj` in one write to a temp file, then swap it into place."""
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(orjson.dumps(obj))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
 
 
 def load_seen(path: str):
     if not os.path.exists(path):
         return set()
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
+        with open(path, "rb") as f:
+            data = orjson.loads(f.read())
             return set(data if isinstance(data, list) else [])
     except Exception:
         return set()
@@ -97,8 +155,7 @@ def load_seen(path: str):
 
 def save_seen(seen_ids, path: str):
     try:
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(list(seen_ids), f)
+        _write_json_atomic(path, sorted(seen_ids))
     except Exception:
         pass
 
@@ -109,27 +166,26 @@ def send_telegram_message(token: str, chat_id: str, text: str):
     url = f"https://api.telegram.org/bot{token}/sendMessage"
     payload = {"chat_id": chat_id, "text": text, "parse_mode": "HTML"}
     try:
-        r = requests.post(url, json=payload, timeout=10)
+        r = get_session().post(url, json=payload, timeout=10)
         if r.status_code == 200:
             return True, r.json()
         return False, r.text
-    except Exception as e:
+    except requests.RequestException as e:
         return False, str(e)
 
 
 def update_last_message_time():
     """Update the timestamp of the last sent message."""
     try:
-        with open("last_message.json", "w", encoding='utf-8') as f:
-            json.dump({"last_message_time": time.time()}, f)
+        _write_json_atomic("last_message.json", {"last_message_time": time.time()})
     except Exception:
         pass
 
 def get_last_message_time():
     """Get the timestamp of the last sent message."""
     try:
-        with open("last_message.json", "r", encoding='utf-8') as f:
-            data = json.load(f)
+        with open("last_message.json", "rb") as f:
+            data = orjson.loads(f.read())
             return data.get("last_message_time")
     except Exception:
         return None
@@ -150,48 +206,113 @@ def check_and_send_alive_message(token: str, chats, heartbeat_days=7):
         if any(ok for _, ok, _ in results):
             update_last_message_time()
 
-def send_to_chats(token: str, chats, text: str):
-    """Send `text` to multiple chat ids. Returns a list of (chat_id, ok, resp) tuples."""
-    results = []
+def format_offer(c) -> str:
+    """Telegram HTML snippet for one offer, with scraped fields escaped."""
+    e = {k: html.escape(str(c.get(k) or ""), quote=False) for k in ("origin", "arrival", "start", "end", "model", "days")}
+    url = html.escape(c.get("url") or "", quote=True)
+    days_info = f"\nDuración: {e['days']} días" if e["days"] else ""
+    return f"✨ <b>{e['origin']} -> {e['arrival']}</b>\n{e['start']} - {e['end']}\n{e['model']}{days_info}\n\n<a href='{url}'>Ver oferta</a>"
+
+
+def chunk_texts(texts, limit: int = MAX_MESSAGE_LEN):
+    """Group consecutive texts so each group joined by MESSAGE_SEPARATOR fits in `limit` chars.
+
+    Returns a list of lists of indexes into `texts`.
+    """
+    chunks = []
+    current = []
+    size = 0
+    for i, text in enumerate(texts):
+        added = len(text) + (len(MESSAGE_SEPARATOR) if current else 0)
+        if current and size + added > limit:
+            chunks.append(current)
+            current = []
+            added = len(text)
+            size = 0
+        current.append(i)
+        size += added
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _send_in_order(token: str, chat_id: str, texts):
+    """Send `texts` to one chat sequentially. Returns a list of (ok, resp) tuples."""
+    return [send_telegram_message(token, chat_id, text) for text in texts]
+
+
+def send_batch(token: str, chats, texts):
+    """Send every text in `texts` to every chat id, chats in parallel and texts in order.
+
+    Returns one list of (chat_id, ok, resp) tuples per text, in the order of `texts`.
+    """
     if not token or not chats:
-        return results
-    for chat in chats:
-        ok, resp = send_telegram_message(token, chat, text)
-        results.append((chat, ok, resp))
-    if any(ok for _, ok, _ in results):
+        return [[] for _ in texts]
+    # one worker per chat keeps each chat's messages in order and avoids
+    # hitting Telegram's per-chat rate limit with parallel sends
+    futures = [_EXECUTOR.submit(_send_in_order, token, chat, texts) for chat in chats]
+    per_chat = [f.result() for f in futures]
+    batch = [[(chat, *sent[i]) for chat, sent in zip(chats, per_chat)] for i in range(len(texts))]
+    if any(ok for results in batch for _, ok, _ in results):
         update_last_message_time()
-    return results
+    return batch
+
+
+def send_to_chats(token: str, chats, text: str):
+    """Send `text` to multiple chat ids. Returns a list of (chat_id, ok, resp) tuples."""
+    return send_batch(token, chats, [text])[0]
 
 
+@functools.lru_cache(maxsize=None)
+def _combining_table():
+    """Translation table deleting every combining code point (built on first use)."""
+    return dict.fromkeys(cp for cp in range(0x110000) if unicodedata.combining(chr(cp)))
+
+
+@functools.lru_cache(maxsize=2048)
 def normalize_city(name: str) -> str:
     """Normalize a city name for comparison: lowercase, strip accents and whitespace."""
     if not name:
         return ""
     name = name.strip().lower()
-    name = unicodedata.normalize("NFKD", name)
-    name = "".join(ch for ch in name if not unicodedata.combining(ch))
-    return name
+    if name.isascii():
+        return name
+    if not unicodedata.is_normalized("NFKD", name):
+        name = unicodedata.normalize("NFKD", name)
+    return name.translate(_combining_table())
+
+
+@functools.lru_cache(maxsize=32)
+def _city_pattern(norm_cities):
+    """Compile one alternation regex matching any of the normalized city names."""
+    return re.compile("|".join(re.escape(nc) for nc in norm_cities))
 
 
 def filter_campers(campers, cities):
     """Return campers where origin or arrival matches any city in 'cities'.
 
     'cities' should be an iterable of raw city names; matching is accent- and case-insensitive.
+    If no usable city is given, all campers are returned.
     """
+    if not cities:
+        return list(campers)
     # Use substring matching on normalized names for flexibility (captures variants)
-    norm_cities = [normalize_city(c) for c in cities]
-    filtered = []
-    for c in campers:
-        o = normalize_city(c.get("origin", ""))
-        a = normalize_city(c.get("arrival", ""))
-        for nc in norm_cities:
-            if nc and (nc in o or nc in a):
-                filtered.append(c)
-                break
-    return filtered
+    norm_cities = tuple(nc for nc in map(normalize_city, cities) if nc)
+    if not norm_cities:
+        return list(campers)
+    pattern = _city_pattern(norm_cities)
+
+    def hit(c):
+        return bool(pattern.search(normalize_city(c.get("origin", "")))
+                    or pattern.search(normalize_city(c.get("arrival", ""))))
+
+    return [c for c in campers if hit(c)]
 
 
 if __name__ == "__main__":
+    # Load configuration
+    config = load_config()
+
     parser = argparse.ArgumentParser(description="Scrape imoova relocations and optionally filter by cities")
     parser.add_argument("--config", help="Path to configuration file",
                         default=DEFAULT_CONFIG_FILE)
@@ -229,7 +350,7 @@ if __name__ == "__main__":
         sys.exit(1)
 
     cities = [c.strip() for c in args.cities.split(",") if c.strip()]
-    filtered = filter_campers(campers, cities) if cities else campers
+    filtered = filter_campers(campers, cities)
 
     print(f"Found {len(filtered)} campers matching cities: {', '.join(cities)}")
     
@@ -238,11 +359,10 @@ if __name__ == "__main__":
     seen = load_seen(args.seen_file)
 
     # Remove any seen IDs that no longer appear on the fetched campers (prune stale entries)
-    current_ids = set(c.get('id') for c in campers if c.get('id'))
+    current_ids = {cid for c in campers if (cid := c.get('id'))}
     stale = seen - current_ids
     if stale:
-        for sid in list(stale):
-            seen.discard(sid)
+        seen -= stale
         save_seen(seen, args.seen_file)
         print(f"Removed {len(stale)} stale offers from {args.seen_file}: {', '.join(sorted(stale))}")
     
@@ -259,19 +379,20 @@ if __name__ == "__main__":
         # Check if we need to send a "still alive" message
         check_and_send_alive_message(args.telegram_token, chats, config.get("heartbeat_days", 7))
         
-        seen = load_seen(args.seen_file)
         new = [c for c in filtered if c.get('id') and c.get('id') not in seen]
-        for c in new:
-            days_info = f"\nDuración: {c.get('days', '')} días" if c.get('days') else ""
-            text = f"✨ <b>{c.get('origin')} -> {c.get('arrival')}</b>\n{c.get('start','')} - {c.get('end','')}\n{c.get('model','')}{days_info}\n\n<a href='{c.get('url', '')}'>Ver oferta</a>"
-            # send and report result
-            results = send_to_chats(args.telegram_token, chats, text)
+        texts = [format_offer(c) for c in new]
+        # pack offers into as few messages as possible, send them all concurrently, then report each one
+        chunks = chunk_texts(texts)
+        messages = [MESSAGE_SEPARATOR.join(texts[i] for i in chunk) for chunk in chunks]
+        for chunk, results in zip(chunks, send_batch(args.telegram_token, chats, messages)):
+            ids = [new[i].get('id') for i in chunk]
+            label = ", ".join(ids)
             success_count = sum(1 for _chat, ok, _resp in results if ok)
-            print(f"Offer [{c.get('id')}] notified to {success_count}/{len(results) if results else 0} chats")
+            print(f"Offers [{label}] notified to {success_count}/{len(results) if results else 0} chats")
             # mark as seen only if ALL notifications were successful
             if success_count == len(chats):
-                seen.add(c.get('id'))
-                print(f"✅ Offer [{c.get('id')}] successfully notified to all chats")
+                seen.update(ids)
+                print(f"✅ Offers [{label}] successfully notified to all chats")
             else:
-                print(f"⚠️ Offer [{c.get('id')}] not marked as seen - some notifications failed")
+                print(f"⚠️ Offers [{label}] not marked as seen - some notifications failed")
         save_seen(seen, args.seen_file)
\ No newline at end of file
@@ -0,0 +1,61 @@
+import main
+
+
+def page(rows: str) -> bytes:
+    return f"<html><body><table>{rows}</table></body></html>".encode()
+
+
+def test_parse_campers_reads_table_rows():
+    campers = main.parse_campers(page(
+        "<tr><th>ID</th><th>Origin</th><th>Arrival</th></tr>"
+        "<tr><td><a href='/en/relocations/1'>1</a></td><td>Zürich</td><td>Paris</td>"
+        "<td>1 Jan</td><td>5 Jan</td><td><b>VW</b> T6</td><td></td><td>4</td></tr>"
+        "<tr><td>2</td><td>Madrid</td><td>Lyon</td></tr>"
+    ))
+    assert campers == [
+        {"id": "1", "url": "https://www.imoova.com/en/relocations/1", "origin": "Zürich", "arrival": "Paris",
+         "start": "1 Jan", "end": "5 Jan", "model": "VWT6", "days": "4"},
+        {"id": "2", "url": "", "origin": "Madrid", "arrival": "Lyon",
+         "start": "", "end": "", "model": "", "days": ""},
+    ]
+
+
+def test_parse_campers_handles_omitted_end_tags():
+    campers = main.parse_campers(page(
+        "<tr><td>1</td><td>Madrid</td><td>Lyon</td>"
+        "<tr><td>2</td><td>Paris</td><td>Berlin</td></tr>"
+    ))
+    assert [c["id"] for c in campers] == ["1", "2"]
+
+
+def test_parse_campers_reads_href_attribute_only():
+    campers = main.parse_campers(page(
+        '<tr><td><a data-href="/wrong" href="/right">1</a></td><td>Madrid</td><td>Lyon</td></tr>'
+        "<tr><td><a href=/x>2</a></td><td>Paris</td><td>Berlin</td></tr>"
+    ))
+    assert [c["url"] for c in campers] == ["https://www.imoova.com/right", "https://www.imoova.com/x"]
+
+
+def test_format_offer_escapes_scraped_fields():
+    text = main.format_offer({"origin": "A & B", "arrival": "<C>", "model": "VW", "days": "3",
+                              "url": "https://x/?a=1&b='2'"})
+    assert "A &amp; B -> &lt;C&gt;" in text
+    assert "<a href='https://x/?a=1&amp;b=&#x27;2&#x27;'>" in text
+
+
+def test_chunk_texts_empty():
+    assert main.chunk_texts([], 10) == []
+
+
+def test_chunk_texts_exact_limit_fits():
+    # 4 + len("\n\n") + 4 == 10
+    assert main.chunk_texts(["aaaa", "bbbb"], 10) == [[0, 1]]
+
+
+def test_chunk_texts_separator_pushes_over_limit():
+    # 5 + len("\n\n") + 4 == 11 > 10
+    assert main.chunk_texts(["aaaaa", "bbbb"], 10) == [[0], [1]]
+
+
+def test_chunk_texts_oversized_text_gets_own_chunk():
+    assert main.chunk_texts(["a", "b" * 20, "c"], 10) == [[0], [1], [2]]